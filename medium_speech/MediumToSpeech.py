@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
 """# -*- coding: utf-8 -*-"""
 
+import cProfile
+import json
 import logging
 import os
 import re
 import subprocess
 import sys
-from contextlib import suppress
-from io import StringIO
+import tracemalloc
+from contextlib import contextmanager, suppress
+from io import BytesIO, StringIO
 from pathlib import Path
 
 import coloredlogs
@@ -17,6 +20,17 @@ from docker.errors import ImageNotFound
 from gtts import gTTS
 from markdown import Markdown
 
+from .mp3_frames import extract_audio, mp3_info
+
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+# Import machinery and tracemalloc itself are noise in per-stage allocation reports.
+TRACEMALLOC_FILTERS = (
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
 
 class LoggingClass:
     @property
@@ -38,16 +52,71 @@ class MediumToSpeech(LoggingClass):
         docker_image="mmphego/mediumexporter",
         tmp_dir="/tmp",
         log_level="INFO",
+        profile_dir=None,
     ):
 
         self.medium_url = medium_url
         self.filename = filename
         self.docker_image = docker_image
         self.tmp_dir = tmp_dir
+        self.profile_dir = profile_dir
+        self._profiling = False
         self.logger.setLevel(log_level.upper())
         coloredlogs.install(level=log_level.upper())
         self.pull_images()
 
+    @contextmanager
+    def profile_stage(self, stage, top=25):
+        """Profile a pipeline stage with cProfile and tracemalloc
+
+        Does nothing unless profile_dir is set. Writes '<stage>.prof' (pstats) and
+        '<stage>.alloc.txt' into profile_dir. The latter has the stage's peak traced
+        memory and the allocation sites whose memory grew most during the stage
+        (snapshot diff), with import machinery filtered out.
+        Stages nested in another profiled stage are counted in the outer one.
+
+        Args:
+            stage (str): Stage name, used for the output filenames
+            top (int, 25): Number of allocation sites to report
+        """
+        if not self.profile_dir or self._profiling:
+            yield
+            return
+
+        profile_dir = Path(self.profile_dir)
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        start_snapshot = tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS)
+        profiler = cProfile.Profile()
+        self._profiling = True
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._profiling = False
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS)
+            if started_tracing:
+                tracemalloc.stop()
+            profiler.dump_stats(str(profile_dir / f"{stage}.prof"))
+            with open(profile_dir / f"{stage}.alloc.txt", "w") as _f:
+                _f.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n")
+                _f.write(
+                    f"Top {top} allocation sites by net growth over the stage "
+                    "(memory freed before the stage ended only counts towards "
+                    "the peak):\n"
+                )
+                for stat in snapshot.compare_to(start_snapshot, "lineno")[:top]:
+                    _f.write(f"{stat}\n")
+            self.logger.info(
+                "Profiled %s stage (peak %.1f KiB) to %s", stage, peak / 1024, profile_dir
+            )
+
     @staticmethod
     def check_url_exist(url):
         _request = requests.get(url)
@@ -231,6 +300,43 @@ class MediumToSpeech(LoggingClass):
         plain_text = md.convert(text)
         return [x for x in plain_text.split("\n") if x]
 
+    def markdown_to_sections(self, md_text="", tab_length=4):
+        """Convert Markdown into plain text lines tagged with their block type
+
+        Args:
+            md_text (bytes, str): Markdown text in the form of bytes
+            tab_length (int, optional): Description
+
+        Returns:
+            sections (list): (kind, line) tuples where kind is 'heading' or 'paragraph',
+                lines match the output of markdown_to_text
+        """
+        if not md_text:
+            md_text = self.read_markdown()
+
+        blocks = []
+
+        def _serializer(element):
+            for child in element:
+                kind = "heading" if child.tag in HEADING_TAGS else "paragraph"
+                blocks.append((kind, self.unmark_element(child)))
+            return ""
+
+        text = self.bytes_to_str(md_text)
+        Markdown.output_formats["sections"] = _serializer
+        md = Markdown(output_format="sections")
+        md.stripTopLevelTags = False
+        md.tab_length = tab_length
+        md.convert(text)
+
+        sections = []
+        for kind, block in blocks:
+            # Restore stashed raw HTML and entities, as convert() does for the whole text.
+            for postprocessor in md.postprocessors:
+                block = postprocessor.run(block)
+            sections.extend((kind, line) for line in block.split("\n") if line)
+        return sections
+
     def clean_up_files(self, file_format="mp3"):
         """Delete old mp3 files"""
         tmp_dir = Path(self.tmp_dir)
@@ -243,24 +349,169 @@ class MediumToSpeech(LoggingClass):
     def text_to_speech(self, cleanup=False):
         """Generate speech from text using Google TTS API
 
+        The export, conversion, normalization and synthesis stages are profiled into
+        profile_dir when it is set, see profile_stage.
+
         Args:
             cleanup (bool, False): Delete MP3 files after playing.
 
         """
-        text_from_markdown = self.markdown_to_text()
-        splitted_words = self.splits_words(text_from_markdown)
+        with self.profile_stage("export"):
+            md_text = self.read_markdown()
+        with self.profile_stage("conversion"):
+            # An empty post must not make markdown_to_text read it a second time.
+            text_from_markdown = self.markdown_to_text(md_text) if md_text else []
+        with self.profile_stage("normalization"):
+            splitted_words = self.splits_words(text_from_markdown)
         self.logger.info("Generate speech from text using Google TTS API")
         if cleanup:
             self.clean_up_files()
-        for words in splitted_words:
-            for count, line in enumerate(words, 1):
-                if line:
-                    self.logger.debug(line)
-                    with suppress(Exception):
-                        tts = gTTS(text=line, lang="en-us")
-                        tts.save(f"{self.tmp_dir}/file_{str(count).zfill(2)}.mp3")
+        with self.profile_stage("synthesis"):
+            for words in splitted_words:
+                for count, line in enumerate(words, 1):
+                    if line:
+                        self.logger.debug(line)
+                        with suppress(Exception):
+                            tts = gTTS(text=line, lang="en-us")
+                            tts.save(f"{self.tmp_dir}/file_{str(count).zfill(2)}.mp3")
         self.logger.info("Done: Generating speech from text using Google TTS API")
 
+    def export_audiobook(self, output_dir=None, name="audiobook", lang="en-us"):
+        """Synthesize the post into a single seekable MP3 with a timestamp index
+
+        Writes '<name>.mp3' (all sections concatenated), '<name>.json' (index),
+        '<name>.m3u' and '<name>.cue' (chapter playlists) into output_dir.
+        Byte offsets and durations are read from MP3 frame headers, nothing is decoded.
+        Seeking to section n is a lookup of index['sections'][n]['offset'].
+
+        Args:
+            output_dir (str, optional): Directory to export to, defaults to tmp_dir
+            name (str, "audiobook"): Base filename of the exported files
+            lang (str, "en-us"): gTTS language
+
+        Returns:
+            index (dict): Sections and chapters with byte offsets and timestamps
+        """
+        output_dir = Path(output_dir or self.tmp_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        audio_file = output_dir / f"{name}.mp3"
+        with self.profile_stage("export"):
+            md_text = self.read_markdown()
+        with self.profile_stage("conversion"):
+            md_sections = self.markdown_to_sections(md_text) if md_text else []
+        with self.profile_stage("normalization"):
+            md_sections = [
+                (kind, self.remove_tags(line).strip()) for kind, line in md_sections
+            ]
+
+        sections = []
+        elapsed = 0.0
+        self.logger.info("Exporting audiobook to %s", str(audio_file))
+        with open(audio_file, "wb") as _f, self.profile_stage("synthesis"):
+            for kind, line in md_sections:
+                if not line:
+                    continue
+                _buffer = BytesIO()
+                try:
+                    gTTS(text=line, lang=lang).write_to_fp(_buffer)
+                except Exception as _err:
+                    self.logger.warning("Skipping %s: %s", repr(line), _err)
+                    continue
+                data = extract_audio(_buffer.getvalue())
+                info = mp3_info(data)
+                if not info["frames"]:
+                    continue
+                sections.append(
+                    {
+                        "index": len(sections),
+                        "kind": kind,
+                        "text": line,
+                        "offset": _f.tell(),
+                        "length": len(data),
+                        "start": round(elapsed, 3),
+                        "duration": round(info["duration"], 3),
+                    }
+                )
+                elapsed += info["duration"]
+                self.logger.debug(line)
+                _f.write(data)
+
+        index = {
+            "version": 1,
+            "audio": audio_file.name,
+            "title": sections[0]["text"] if sections else name,
+            "bytes": audio_file.stat().st_size,
+            "duration": round(elapsed, 3),
+            "sections": sections,
+            "chapters": self.chapters_from_sections(sections),
+        }
+        with open(output_dir / f"{name}.json", "w") as _f:
+            json.dump(index, _f, indent=2)
+        with open(output_dir / f"{name}.m3u", "w") as _f:
+            _f.write(self.index_to_m3u(index))
+        with open(output_dir / f"{name}.cue", "w") as _f:
+            _f.write(self.index_to_cue(index))
+        self.logger.info("Done: Exporting audiobook to %s", str(audio_file))
+        return index
+
+    @staticmethod
+    def chapters_from_sections(sections):
+        """Group sections into chapters, a new chapter starts at every heading
+
+        Args:
+            sections (list): Section entries of an audiobook index
+
+        Returns:
+            chapters (list): Title, first section, byte offset, start and end times
+        """
+        chapters = []
+        for section in sections:
+            if section["kind"] == "heading" or not chapters:
+                chapters.append(
+                    {
+                        "title": section["text"],
+                        "section": section["index"],
+                        "offset": section["offset"],
+                        "start": section["start"],
+                    }
+                )
+            chapters[-1]["end"] = round(section["start"] + section["duration"], 3)
+        return chapters
+
+    @staticmethod
+    def index_to_m3u(index):
+        """Render audiobook chapters as an extended M3U playlist (VLC start/stop times)"""
+        lines = ["#EXTM3U"]
+        for chapter in index["chapters"]:
+            duration = round(chapter["end"] - chapter["start"])
+            lines += [
+                f"#EXTINF:{duration},{chapter['title']}",
+                f"#EXTVLCOPT:start-time={chapter['start']}",
+                f"#EXTVLCOPT:stop-time={chapter['end']}",
+                index["audio"],
+            ]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def index_to_cue(index):
+        """Render audiobook chapters as a cue sheet, one track per chapter"""
+
+        def _timestamp(seconds):
+            # Cue sheets count in minutes, seconds and 1/75 second frames.
+            frames = int(round(seconds * 75))
+            return f"{frames // 4500:02d}:{frames // 75 % 60:02d}:{frames % 75:02d}"
+
+        title = index["title"].replace('"', "'")
+        lines = [f'TITLE "{title}"', f'FILE "{index["audio"]}" MP3']
+        for count, chapter in enumerate(index["chapters"], 1):
+            title = chapter["title"].replace('"', "'")
+            lines += [
+                f"  TRACK {count:02d} AUDIO",
+                f'    TITLE "{title}"',
+                f"    INDEX 01 {_timestamp(chapter['start'])}",
+            ]
+        return "\n".join(lines) + "\n"
+
     def play_it(self, play_with="cvlc", speed=0, cleanup=False):
         """Play generated TTS as mp3 files
 
@@ -290,14 +541,15 @@ class MediumToSpeech(LoggingClass):
             play_cmd = play_with
 
         self.logger.info("Playing generated TTS data with %s", play_with)
-        for mp3_file in sorted(mp3_files):
-            if mp3_file.is_file():
-                self.logger.info("Playing %s", mp3_file)
-                subprocess.call(
-                    f"{play_cmd} {mp3_file}",
-                    shell=True,
-                    stdout=FNULL,
-                    stderr=subprocess.STDOUT,
-                )
+        with self.profile_stage("playback"):
+            for mp3_file in sorted(mp3_files):
+                if mp3_file.is_file():
+                    self.logger.info("Playing %s", mp3_file)
+                    subprocess.call(
+                        f"{play_cmd} {mp3_file}",
+                        shell=True,
+                        stdout=FNULL,
+                        stderr=subprocess.STDOUT,
+                    )
         if cleanup:
             self.clean_up_files()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""# -*- coding: utf-8 -*-"""
+
+import json
+import xml.etree.ElementTree as ET
+from email.utils import formatdate
+from pathlib import Path
+
+from .MediumToSpeech import LoggingClass
+from .mp3_frames import mp3_info
+
+ITUNES_NS = "http://www.itunes.com/dtds/podcast-1.0.dtd"
+ET.register_namespace("itunes", ITUNES_NS)
+
+
+class PodcastFeed(LoggingClass):
+    def __init__(
+        self,
+        feed_file,
+        base_url="",
+        title="Medium to Speech",
+        link="https://medium.com",
+        description="Medium posts as Markdown to Speech.",
+        language="en-us",
+        log_level="INFO",
+    ):
+        """Podcast RSS feed of synthesized posts
+
+        Episode metadata (enclosure size, duration, date) is cached next to the feed
+        in '<feed_file>.json' (e.g. 'feed.xml.json'), so adding an episode only
+        measures the new MP3.
+
+        Args:
+            feed_file (str): Path of the RSS XML file to write
+            base_url (str, optional): URL prefix the MP3 files are served from
+            title (str, optional): Podcast title
+            link (str, optional): Podcast website
+            description (str, optional): Podcast description
+            language (str, "en-us"): Podcast language
+            log_level (str, "INFO"): log level to use
+        """
+        self.feed_file = Path(feed_file)
+        self.cache_file = self.feed_file.with_name(self.feed_file.name + ".json")
+        self.base_url = base_url.rstrip("/")
+        self.title = title
+        self.link = link
+        self.description = description
+        self.language = language
+        self.logger.setLevel(log_level.upper())
+        self.episodes = self.load()
+
+    def load(self):
+        """Load cached episode metadata
+
+        Returns:
+            episodes (dict): Episodes keyed by absolute MP3 path
+        """
+        if not self.cache_file.is_file():
+            return {}
+        with open(self.cache_file) as _f:
+            return json.load(_f)
+
+    def save(self):
+        """Write the episode cache and the RSS feed"""
+        self.feed_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, "w") as _f:
+            json.dump(self.episodes, _f, indent=2)
+        ET.ElementTree(self.to_xml()).write(
+            self.feed_file, encoding="UTF-8", xml_declaration=True
+        )
+        self.logger.debug("Wrote %s episodes to %s", len(self.episodes), self.feed_file)
+
+    def is_current(self, audio_file):
+        """Check whether an MP3 is already in the feed and unchanged on disk"""
+        audio_file = Path(audio_file).resolve()
+        episode = self.episodes.get(str(audio_file))
+        if not episode:
+            return False
+        stat = audio_file.stat()
+        return episode["length"] == stat.st_size and episode["mtime"] == stat.st_mtime
+
+    def add_episode(self, audio_file, title=None, link=None, save=True):
+        """Add or refresh a single episode
+
+        Durations come from the audiobook index written by export_audiobook when one
+        sits next to the MP3, otherwise from the MP3 frame headers.
+
+        Args:
+            audio_file (str): Path of the episode MP3
+            title (str, optional): Episode title, defaults to the index title
+            link (str, optional): Link to the original post
+            save (bool, True): Write the feed after adding
+
+        Returns:
+            episode (dict): Cached episode metadata
+        """
+        audio_file = Path(audio_file).resolve()
+        stat = audio_file.stat()
+        index_file = audio_file.with_suffix(".json")
+        index = {}
+        if index_file.is_file():
+            with open(index_file) as _f:
+                index = json.load(_f)
+        if index.get("bytes") == stat.st_size and "duration" in index:
+            duration = index["duration"]
+        else:
+            duration = mp3_info(audio_file)["duration"]
+
+        episode = {
+            "title": title or index.get("title") or audio_file.stem,
+            "link": link or self.link,
+            "url": f"{self.base_url}/{audio_file.name}",
+            "length": stat.st_size,
+            "duration": round(duration, 3),
+            "mtime": stat.st_mtime,
+        }
+        self.episodes[str(audio_file)] = episode
+        self.logger.info("Added %s to podcast feed", repr(episode["title"]))
+        if save:
+            self.save()
+        return episode
+
+    def update(self, library_dir):
+        """Add new or changed MP3s from a directory, unchanged episodes are not measured
+
+        Episodes whose MP3 was deleted from library_dir are dropped from the feed.
+
+        Args:
+            library_dir (str): Directory of exported audiobooks
+
+        Returns:
+            added (list): Episodes that were added or refreshed
+        """
+        library_dir = Path(library_dir).resolve()
+        removed = [
+            audio_file
+            for audio_file in self.episodes
+            if Path(audio_file).parent == library_dir and not Path(audio_file).is_file()
+        ]
+        for audio_file in removed:
+            self.logger.info("Removed %s from podcast feed", repr(audio_file))
+            del self.episodes[audio_file]
+
+        added = [
+            self.add_episode(audio_file, save=False)
+            for audio_file in sorted(library_dir.glob("*.mp3"))
+            if not self.is_current(audio_file)
+        ]
+        if added or removed or not self.feed_file.is_file():
+            self.save()
+        return added
+
+    @staticmethod
+    def format_duration(seconds):
+        """Format seconds as HH:MM:SS for itunes:duration"""
+        seconds = int(round(seconds))
+        return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+    def to_xml(self):
+        """Build the RSS element tree, newest episode first
+
+        Returns:
+            rss (Element): RSS 2.0 root element
+        """
+        rss = ET.Element("rss", {"version": "2.0"})
+        channel = ET.SubElement(rss, "channel")
+        for tag, text in (
+            ("title", self.title),
+            ("link", self.link),
+            ("description", self.description),
+            ("language", self.language),
+        ):
+            ET.SubElement(channel, tag).text = text
+
+        episodes = sorted(self.episodes.values(), key=lambda e: e["mtime"], reverse=True)
+        for episode in episodes:
+            item = ET.SubElement(channel, "item")
+            ET.SubElement(item, "title").text = episode["title"]
+            ET.SubElement(item, "link").text = episode["link"]
+            ET.SubElement(item, "guid", {"isPermaLink": "false"}).text = episode["url"]
+            ET.SubElement(item, "pubDate").text = formatdate(episode["mtime"])
+            enclosure = {
+                "url": episode["url"],
+                "length": str(episode["length"]),
+                "type": "audio/mpeg",
+            }
+            ET.SubElement(item, "enclosure", enclosure)
+            ET.SubElement(item, f"{{{ITUNES_NS}}}duration").text = self.format_duration(
+                episode["duration"]
+            )
+        return rss
@@ -1 +1,2 @@
 from .MediumToSpeech import MediumToSpeech
+from .PodcastFeed import PodcastFeed
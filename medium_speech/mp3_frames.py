@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""# -*- coding: utf-8 -*-"""
+
+import os
+from collections import namedtuple
+from io import BytesIO
+
+# Bitrates in kbps, keyed by (MPEG version, layer). Index 0 is 'free' and 15 is 'bad'.
+BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Sample rates in Hz, keyed by MPEG version (2.5 is stored as 25).
+SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    25: (11025, 12000, 8000),
+}
+VERSIONS = {0: 25, 2: 2, 3: 1}
+LAYERS = {1: 3, 2: 2, 3: 1}
+INFO_TAGS = (b"Xing", b"Info", b"VBRI")
+
+Frame = namedtuple("Frame", ["offset", "length", "samples", "sample_rate", "is_info"])
+
+
+def parse_header(header):
+    """Parse a 4 byte MPEG audio frame header
+
+    Args:
+        header (bytes): 4 bytes starting at a possible frame sync
+
+    Returns:
+        tuple: (frame length, samples per frame, sample rate) or None if invalid
+    """
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version = VERSIONS.get((header[1] >> 3) & 0x03)
+    layer = LAYERS.get((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    if not version or not layer or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = BITRATES[(min(version, 2), layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or version == 1) else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return length, samples, sample_rate
+
+
+def skip_id3v2(fp):
+    """Seek past an ID3v2 tag at the current position
+
+    Returns:
+        int: Position after the tag, or None (position unchanged) if there is no
+            complete tag header
+    """
+    start = fp.tell()
+    header = fp.read(10)
+    if len(header) == 10 and header[:3] == b"ID3":
+        size = 0
+        for byte in header[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        footer = 10 if header[5] & 0x10 else 0
+        return fp.seek(start + 10 + size + footer)
+    fp.seek(start)
+    return None
+
+
+def info_tag_offset(header):
+    """Byte offset of a Xing/Info tag, which follows the Layer III side information"""
+    mono = (header[3] >> 6) == 3
+    if VERSIONS.get((header[1] >> 3) & 0x03) == 1:
+        return 21 if mono else 36
+    return 13 if mono else 21
+
+
+def iter_frames(fp):
+    """Walk MPEG audio frames by reading headers only, no audio is decoded.
+
+    ID3v2 tags are skipped wherever they appear, since joined MP3 streams (e.g. from
+    gTTS.write_to_fp) carry a tag and a Xing/Info frame per chunk.
+
+    Args:
+        fp (file, bytes): Binary file object (seekable) or MP3 data
+
+    Yields:
+        Frame: offset, length, samples, sample_rate and whether it is a Xing/Info frame
+    """
+    if isinstance(fp, (bytes, bytearray)):
+        fp = BytesIO(fp)
+    offset = fp.tell()
+    while True:
+        header = fp.read(4)
+        if len(header) < 4:
+            return
+        if header[:3] == b"ID3":
+            fp.seek(offset)
+            # A truncated tag or a stray "ID3" in junk is skipped like lost sync.
+            offset = skip_id3v2(fp) or fp.seek(offset + 1)
+            continue
+        parsed = parse_header(header)
+        if parsed is None:
+            # Lost sync (junk or trailing tag), advance one byte and try again.
+            offset = fp.seek(offset + 1)
+            continue
+        length, samples, sample_rate = parsed
+        tag_offset = info_tag_offset(header)
+        body = fp.read(max(tag_offset, 36))
+        is_info = body[tag_offset - 4 : tag_offset] in INFO_TAGS[:2]
+        is_info = is_info or body[32:36] == INFO_TAGS[2]
+        yield Frame(offset, length, samples, sample_rate, is_info)
+        offset = fp.seek(offset + length)
+
+
+def extract_audio(data):
+    """Keep only the audio frames of MP3 data
+
+    Args:
+        data (bytes): MP3 data
+
+    Returns:
+        bytes: Frames without ID3 tags, Xing/Info frames or junk, safe to concatenate
+    """
+    return b"".join(
+        data[frame.offset : frame.offset + frame.length]
+        for frame in iter_frames(data)
+        if not frame.is_info
+    )
+
+
+def mp3_info(source):
+    """Measure an MP3 from its frame headers
+
+    Args:
+        source (str, Path, bytes, file): MP3 file path, data or binary file object
+
+    Returns:
+        dict: 'offset' of the first audio frame, 'length' of all audio frames in
+            bytes, 'frames' count and 'duration' in seconds. ID3 tags and Xing/Info
+            frames are excluded.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as _f:
+            return mp3_info(_f)
+
+    info = {"offset": 0, "length": 0, "frames": 0, "duration": 0.0}
+    for frame in iter_frames(source):
+        if frame.is_info:
+            continue
+        if not info["frames"]:
+            info["offset"] = frame.offset
+        info["frames"] += 1
+        info["length"] += frame.length
+        info["duration"] += frame.samples / frame.sample_rate
+    return info
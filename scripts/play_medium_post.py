@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 """# -*- coding: utf-8 -*-"""
 import argparse
+from pathlib import Path
+
 import argcomplete
-from medium_speech import MediumToSpeech
+from medium_speech import MediumToSpeech, PodcastFeed
 
 
 def main():
@@ -34,15 +36,63 @@ def main():
         default="INFO",
         help="log level to use, default [INFO], options [INFO, DEBUG, ERROR]",
     )
+    parser.add_argument(
+        "--export",
+        "-e",
+        dest="export_dir",
+        help="Export a seekable audiobook (MP3, JSON index, M3U and cue sheet) to dir.",
+    )
+    parser.add_argument(
+        "--feed",
+        dest="feed_file",
+        help="Add the exported audiobook to this podcast RSS feed "
+        "(requires --export and --base-url).",
+    )
+    parser.add_argument(
+        "--base-url",
+        dest="base_url",
+        help="URL prefix the exported MP3 files are served from, used in the feed.",
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profile_dir",
+        help="Profile each pipeline stage (cProfile and tracemalloc) into dir.",
+    )
     parser.add_argument("--url-post", "-u", dest="medium_url", help="Medium post URL.")
     parser.add_argument("--file", dest="markdown_file", help="Specify a Markdown file.")
     argcomplete.autocomplete(parser)
     args = vars(parser.parse_args())
+    if args.get("feed_file") and not (args.get("export_dir") and args.get("base_url")):
+        parser.error("--feed requires --export and --base-url")
+    if args.get("export_dir") and (args.get("play_it") or args.get("cleanup")):
+        parser.error("--export cannot be combined with --play or --cleanup")
     medium_to_speech = MediumToSpeech(
         medium_url=args.get("medium_url"),
         filename=args.get("markdown_file"),
         log_level=args.get("log_level", "INFO"),
+        profile_dir=args.get("profile_dir"),
     )
+    if args.get("export_dir"):
+        source = args.get("medium_url") or args.get("markdown_file") or "audiobook"
+        name = Path(source.rstrip("/")).stem
+        index = medium_to_speech.export_audiobook(
+            output_dir=args.get("export_dir"), name=name
+        )
+        if args.get("feed_file") and not index["sections"]:
+            medium_to_speech.logger.warning(
+                "Nothing was synthesized, not adding %s to the podcast feed", name
+            )
+        elif args.get("feed_file"):
+            feed = PodcastFeed(
+                args.get("feed_file"),
+                base_url=args.get("base_url"),
+                log_level=args.get("log_level", "INFO"),
+            )
+            feed.add_episode(
+                Path(args.get("export_dir")) / f"{name}.mp3",
+                link=args.get("medium_url"),
+            )
+        return
     medium_to_speech.text_to_speech(cleanup=args.get("cleanup"))
     if args.get("play_it"):
         medium_to_speech.play_it(speed=args.get("n_speed"), cleanup=args.get("cleanup"))
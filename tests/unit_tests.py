@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
+import os
 import random
 import unittest
 import warnings
 
 from gtts.tts import gTTS, gTTSError
 
-from medium_speech import MediumToSpeech
+from medium_speech import MediumToSpeech, PodcastFeed
+from medium_speech.mp3_frames import extract_audio, mp3_info, parse_header
 
 from . import utils
 
@@ -123,3 +125,145 @@ class test_MediumtoSpeech(unittest.TestCase):
         plain_text = ", ".join(self.medium_speech.markdown_to_text(md_text=md_text))
         expected_plain_text = "Markdown Test, Hello world!"
         self.assertEqual(plain_text, expected_plain_text)
+
+    def test_markdown_to_sections(self):
+        """ Raise AssertionError if headings and paragraphs are not tagged. """
+        md_text = b"# Markdown Test\n" b"**Hello world!**\n"
+        sections = self.medium_speech.markdown_to_sections(md_text=md_text)
+        expected_sections = [("heading", "Markdown Test"), ("paragraph", "Hello world!")]
+        self.assertEqual(sections, expected_sections)
+
+    def test_markdown_to_sections_with_html(self):
+        """ Raise AssertionError if raw HTML or entities are left as placeholders. """
+        md_text = (
+            b"Hello <b>world</b> &amp; you\n\n"
+            b"<figure><img src='x.png'>\n<figcaption>Caption</figcaption></figure>\n"
+        )
+        sections = self.medium_speech.markdown_to_sections(md_text=md_text)
+        plain_text = self.medium_speech.markdown_to_text(md_text=md_text)
+        self.assertEqual([line for _, line in sections], plain_text)
+        self.assertEqual(sections[0], ("paragraph", "Hello <b>world</b> &amp; you"))
+        self.assertIn("Caption", self.medium_speech.remove_tags(sections[-1][1]))
+
+    def test_chapters_from_sections(self):
+        """ Raise AssertionError if chapters do not start at headings. """
+        keys = ("index", "kind", "text", "offset", "start", "duration")
+        sections = [
+            dict(zip(keys, (0, "heading", "A", 0, 0, 1))),
+            dict(zip(keys, (1, "paragraph", "a", 9, 1, 2))),
+            dict(zip(keys, (2, "heading", "B", 20, 3, 1))),
+        ]
+        chapters = self.medium_speech.chapters_from_sections(sections)
+        self.assertEqual([c["title"] for c in chapters], ["A", "B"])
+        self.assertEqual([c["end"] for c in chapters], [3, 4])
+
+    def test_profile_stage(self):
+        """ Raise AssertionError if stage profiles are not written. """
+        tmp_path = utils.create_tmp_dir("/tmp/profile_tests")
+        self.medium_speech.profile_dir = tmp_path
+        with self.medium_speech.profile_stage("conversion"):
+            with self.medium_speech.profile_stage("nested"):
+                self.medium_speech.markdown_to_text(md_text=b"# Markdown Test\n")
+        self.assertTrue((tmp_path / "conversion.prof").is_file())
+        alloc_summary = (tmp_path / "conversion.alloc.txt").read_text()
+        self.assertIn("net growth", alloc_summary)
+        self.assertNotIn("importlib", alloc_summary)
+        self.assertFalse((tmp_path / "nested.prof").exists())
+        utils.delete_folder(tmp_path)
+
+
+class test_MP3Frames(unittest.TestCase):
+    # MPEG-2 Layer III, 32 kbps, 24 kHz: 96 byte frames of 576 samples.
+    header = bytes([0xFF, 0xF3, 0x44, 0xC4])
+    frame = header + b"\0" * 92
+
+    def test_parse_header(self):
+        """ Raise AssertionError if frame length, samples or sample rate is wrong. """
+        self.assertEqual(parse_header(self.header), (96, 576, 24000))
+        self.assertIsNone(parse_header(b"TAG\0"))
+
+    def test_mp3_info(self):
+        """ Raise AssertionError if tags and Info frames are counted as audio. """
+        id3 = b"ID3\x04\x00\x00\x00\x00\x00\x05" + b"x" * 5
+        info_frame = self.header + b"\0" * 9 + b"Info" + b"\0" * 79
+        data = id3 + info_frame + self.frame * 10 + b"TAG" + b"a" * 125
+        info = mp3_info(data)
+        self.assertEqual(info["offset"], len(id3) + len(info_frame))
+        self.assertEqual(info["length"], 960)
+        self.assertEqual(info["frames"], 10)
+        self.assertAlmostEqual(info["duration"], 0.24)
+
+    def test_mp3_info_joined_chunks(self):
+        """ Raise AssertionError if tags and Info frames inside joined chunks count. """
+        id3 = b"ID3\x04\x00\x00\x00\x00\x00\x05" + b"x" * 5
+        info_frame = self.header + b"\0" * 9 + b"Info" + b"\0" * 79
+        data = (id3 + info_frame + self.frame * 10) * 3
+        info = mp3_info(data)
+        self.assertEqual(info["frames"], 30)
+        self.assertEqual(info["length"], 2880)
+        self.assertAlmostEqual(info["duration"], 0.72)
+        self.assertEqual(extract_audio(data), self.frame * 30)
+
+    def test_mp3_info_truncated_tag(self):
+        """ Raise AssertionError if a truncated or stray ID3 tag stops the walk. """
+        for tail in (b"ID3\x04\x00", b"\x00ID3\x04", b"ID3\x04" + self.frame):
+            info = mp3_info(self.frame * 3 + tail)
+            self.assertGreaterEqual(info["frames"], 3)
+        self.assertEqual(mp3_info(self.frame * 3 + b"ID3\x04\x00")["frames"], 3)
+
+
+class test_PodcastFeed(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = utils.create_tmp_dir("/tmp/podcast_feed_tests")
+        # 250 frames of MPEG-2 Layer III, 32 kbps, 24 kHz: 6 seconds of audio.
+        self.audio_file = self.tmp_path / "episode.mp3"
+        self.audio_file.write_bytes((bytes([0xFF, 0xF3, 0x44, 0xC4]) + b"\0" * 92) * 250)
+        self.feed = PodcastFeed(self.tmp_path / "feed.xml", base_url="http://example.com")
+
+    def tearDown(self):
+        utils.delete_folder(self.tmp_path)
+
+    def test_update(self):
+        """ Raise AssertionError if enclosure size or duration is wrong. """
+        added = self.feed.update(self.tmp_path)
+        self.assertEqual(len(added), 1)
+        self.assertEqual(added[0]["url"], "http://example.com/episode.mp3")
+        self.assertEqual(added[0]["length"], 24000)
+        self.assertEqual(added[0]["duration"], 6.0)
+        self.assertIn(b"<itunes:duration>00:00:06<", self.feed.feed_file.read_bytes())
+        self.assertTrue((self.tmp_path / "feed.xml.json").is_file())
+
+    def test_update_is_incremental(self):
+        """ Raise AssertionError if unchanged episodes are measured again. """
+        self.feed.update(self.tmp_path)
+        feed = PodcastFeed(self.feed.feed_file)
+        self.assertTrue(feed.is_current(self.audio_file))
+        self.assertEqual(feed.update(self.tmp_path), [])
+
+    def test_add_episode_relative_path(self):
+        """ Raise AssertionError if one MP3 is added twice under different paths. """
+        self.feed.update(self.tmp_path)
+        cwd = os.getcwd()
+        os.chdir(self.tmp_path)
+        try:
+            self.feed.add_episode("episode.mp3")
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(len(self.feed.episodes), 1)
+
+    def test_update_prunes_deleted(self):
+        """ Raise AssertionError if a deleted MP3 stays in the feed. """
+        self.feed.update(self.tmp_path)
+        self.audio_file.unlink()
+        self.assertEqual(self.feed.update(self.tmp_path), [])
+        self.assertEqual(self.feed.episodes, {})
+        self.assertNotIn(b"episode.mp3", self.feed.feed_file.read_bytes())
+
+    def test_update_truncated_mp3(self):
+        """ Raise AssertionError if a partly written MP3 blocks the feed update. """
+        truncated = self.tmp_path / "truncated.mp3"
+        truncated.write_bytes(self.audio_file.read_bytes()[:960] + b"ID3\x04\x00")
+        added = self.feed.update(self.tmp_path)
+        self.assertEqual(len(added), 2)
+        self.assertEqual(self.feed.episodes[str(truncated.resolve())]["duration"], 0.24)
+        self.assertTrue(self.feed.feed_file.is_file())